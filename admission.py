@@ -0,0 +1,166 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request, status
+
+from config import settings
+
+
+class TokenBucket:
+    """
+    Classic token bucket. Holds up to `capacity` tokens and refills at
+    `rate` tokens per second. Each admitted request takes one token.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available and return 0.
+        Otherwise return the number of seconds until one will be.
+        """
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Keeps one token bucket per key. The least recently used buckets are
+    dropped once `max_keys` is reached so memory stays bounded.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[tuple[str, ...], TokenBucket] = OrderedDict()
+
+    def try_acquire(self, key: tuple[str, ...], per_minute: float, burst: int):
+        """Return 0 if the request is admitted, else seconds to wait."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(per_minute / 60, burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+
+class LoadShedError(Exception):
+    """Raised when a request could not get a slot within the queue limits."""
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many requests run at once. Up to `max_queue` extra requests
+    may wait for a slot, each for at most `queue_timeout` seconds.
+    """
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self._waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise LoadShedError
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except TimeoutError:
+            raise LoadShedError
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+rate_limiter = RateLimiter(settings.rate_limit_max_clients)
+
+db_write_limiter = ConcurrencyLimiter(
+    settings.db_write_concurrency, settings.db_write_queue, settings.db_queue_timeout
+)
+db_read_limiter = ConcurrencyLimiter(
+    settings.db_read_concurrency, settings.db_read_queue, settings.db_queue_timeout
+)
+upload_limiter = ConcurrencyLimiter(
+    settings.upload_concurrency
+    or settings.thumbnail_workers
+    or os.process_cpu_count()
+    or 1,
+    settings.upload_queue,
+    settings.db_queue_timeout,
+)
+
+
+def _retry_after(seconds: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def _check_rate_limits(client: str, route_name: str):
+    wait = rate_limiter.try_acquire(
+        (client,), settings.client_rate_per_minute, settings.client_rate_burst
+    )
+    if not wait and route_name in settings.route_rate_limits:
+        per_minute, burst = settings.route_rate_limits[route_name]
+        wait = rate_limiter.try_acquire((client, route_name), per_minute, burst)
+    if wait:
+        raise HTTPException(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please slow down.",
+            headers=_retry_after(wait),
+        )
+
+
+async def admission_control(request: Request):
+    """
+    App wide dependency that rate limits each client, and caps concurrency
+    for the DB heavy and upload routes listed in settings. Requests that
+    would wait too long for a slot are rejected with a 503 instead of
+    piling up.
+    """
+    if not settings.admission_control_enabled:
+        yield
+        return
+
+    route_name = request.scope["route"].name
+    client = request.client.host if request.client else "unknown"
+    _check_rate_limits(client, route_name)
+
+    if route_name in settings.upload_routes:
+        limiter = upload_limiter
+    elif route_name in settings.db_write_routes:
+        limiter = db_write_limiter
+    elif route_name in settings.db_read_routes:
+        limiter = db_read_limiter
+    else:
+        yield
+        return
+
+    try:
+        async with limiter.slot():
+            yield
+    except LoadShedError:
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy. Please try again shortly.",
+            headers=_retry_after(settings.shed_retry_after_seconds),
+        )
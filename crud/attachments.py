@@ -0,0 +1,39 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+
+async def get_attachment_by_id(attachment_id: int, db: AsyncSession):
+    """
+    Return first instance of attachment in database matching the attachment id.
+    Else None.
+    """
+    result = await db.execute(
+        select(models.Attachment).where(models.Attachment.id == attachment_id)
+    )
+    return result.scalars().first()
+
+
+async def get_post_attachments(post_id: int, db: AsyncSession):
+    """
+    Return all the attachments uploaded for a post, oldest first.
+    """
+    result = await db.execute(
+        select(models.Attachment)
+        .where(models.Attachment.post_id == post_id)
+        .order_by(models.Attachment.id)
+    )
+    return result.scalars().all()
+
+
+async def count_attachments_by_sha256(sha256: str, db: AsyncSession) -> int:
+    """
+    Return how many attachments reference the stored blob with this digest.
+    """
+    result = await db.execute(
+        select(func.count())
+        .select_from(models.Attachment)
+        .where(models.Attachment.sha256 == sha256)
+    )
+    return result.scalar_one()
@@ -28,3 +28,16 @@ async def get_post_by_id(post_id: int, db: AsyncSession):
         .where(models.Post.id == post_id)
     )
     return result.scalars().first()
+
+
+async def get_archived_post_by_id(post_id: int, db: AsyncSession):
+    """
+    Return the archived post matching the post id, for posts that were moved
+    out of the posts table. Else None.
+    """
+    result = await db.execute(
+        select(models.ArchivedPost)
+        .options(selectinload(models.ArchivedPost.author))
+        .where(models.ArchivedPost.id == post_id)
+    )
+    return result.scalars().first()
@@ -1,17 +1,62 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
-SQLALCHEMY_DB_URL = "sqlite+aiosqlite:///./app.db"
+from config import settings
 
-engine = create_async_engine(
-    SQLALCHEMY_DB_URL,
-    connect_args={"check_same_thread": False},
+SQLALCHEMY_DB_URL = settings.database_url
+
+
+def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    # SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to.
+    cursor.execute("PRAGMA foreign_keys=ON")
+    # Lets maintenance return free pages with incremental_vacuum. Only takes
+    # effect on a new database, or after a full VACUUM on an existing one.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.close()
+
+
+def build_engine(url: str):
+    """
+    Create an async engine for the given url. SQLite gets the options it
+    needs for use across threads, other backends get a sized connection pool.
+    """
+    options = {
+        "echo": settings.database_echo,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+    is_sqlite = make_url(url).get_backend_name() == "sqlite"
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options["pool_size"] = settings.database_pool_size
+        options["max_overflow"] = settings.database_max_overflow
+        options["pool_recycle"] = settings.database_pool_recycle
+    new_engine = create_async_engine(url, **options)
+    if is_sqlite:
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+engine = build_engine(SQLALCHEMY_DB_URL)
+
+# GET routes read from the replica when one is configured, else the primary.
+read_engine = (
+    build_engine(settings.database_replica_url)
+    if settings.database_replica_url
+    else engine
 )
 
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+ReadSessionLocal = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
 
 class Base(DeclarativeBase):
     pass
@@ -20,3 +65,15 @@ class Base(DeclarativeBase):
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def get_read_db():
+    """Session for read only routes. May lag behind the primary on a replica."""
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
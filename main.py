@@ -14,9 +14,20 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+import maintenance
+import migrations
 import models
-from database import AsyncSessionLocal, Base, engine, get_db
-from routers import posts, users
+import storage
+from admission import admission_control
+from crud.posts import get_archived_post_by_id
+from database import (
+    AsyncSessionLocal,
+    Base,
+    dispose_engines,
+    engine,
+    get_read_db,
+)
+from routers import attachments, posts, users
 from utils import format_date, seed_tags
 
 
@@ -24,15 +35,21 @@ from utils import format_date, seed_tags
 async def lifespan(_app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await migrations.upgrade_schema(engine)
+    await maintenance.check_auto_vacuum(engine)
 
     async with AsyncSessionLocal() as db:
         await seed_tags(db)
 
+    storage.start_thumbnail_pool()
+    maintenance.start_maintenance_task()
     yield
-    await engine.dispose()
+    await maintenance.stop_maintenance_task()
+    storage.shutdown_thumbnail_pool()
+    await dispose_engines()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(admission_control)])
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -41,11 +58,12 @@ templates.env.filters["format_date"] = format_date
 
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(posts.router, prefix="/api/posts", tags=["posts"])
+app.include_router(attachments.router, prefix="/api/attachments", tags=["attachments"])
 
 
 @app.get("/", include_in_schema=False, name="home")
 @app.get("/posts", include_in_schema=False, name="posts")
-async def home(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
+async def home(request: Request, db: Annotated[AsyncSession, Depends(get_read_db)]):
     result = await db.execute(
         select(models.Post).options(
             selectinload(models.Post.author), selectinload(models.Post.tags)
@@ -59,7 +77,7 @@ async def home(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
 
 @app.get("/posts/{user_id}/post", include_in_schema=False, name="user_posts_page")
 async def user_posts_page(
-    request: Request, user_id: int, db: Annotated[AsyncSession, Depends(get_db)]
+    request: Request, user_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
 ):
     result = await db.execute(select(models.User).where(models.User.id == user_id))
     user = result.scalars().first()
@@ -80,14 +98,20 @@ async def user_posts_page(
 
 @app.get("/posts/{post_id}", include_in_schema=False)
 async def post_page(
-    request: Request, post_id: int, db: Annotated[AsyncSession, Depends(get_db)]
+    request: Request, post_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
 ):
     result = await db.execute(
         select(models.Post)
-        .options(selectinload(models.Post.author), selectinload(models.Post.tags))
+        .options(
+            selectinload(models.Post.author),
+            selectinload(models.Post.tags),
+            selectinload(models.Post.attachments),
+        )
         .where(models.Post.id == post_id)
     )
     post = result.scalars().first()
+    if not post:
+        post = await get_archived_post_by_id(post_id, db)
     if post:
         title = post.title[:20]
         return templates.TemplateResponse(
@@ -116,6 +140,7 @@ async def general_http_exception_handler(
             "message": message,
         },
         status_code=exception.status_code,
+        headers=getattr(exception, "headers", None),
     )
 
 
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, distinct, func, insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import selectinload
+from starlette.concurrency import run_in_threadpool
+
+import models
+import storage
+from config import settings
+from crud.attachments import count_attachments_by_sha256
+from database import AsyncSessionLocal, Base, engine
+
+logger = logging.getLogger(__name__)
+
+# Background task started in the app lifespan.
+_maintenance_task: asyncio.Task | None = None
+
+
+async def archive_old_posts(
+    db: AsyncSession, older_than: timedelta, batch_size: int
+) -> int:
+    """
+    Move posts older than `older_than` into the archived_posts table, one
+    batch per transaction. Posts with attachments are left in place.
+    Returns the number of archived posts.
+    """
+    cutoff = datetime.now(UTC) - older_than
+    archived = 0
+    while True:
+        result = await db.execute(
+            select(models.Post)
+            .options(selectinload(models.Post.tags))
+            .where(
+                models.Post.created_at < cutoff,
+                ~models.Post.attachments.any(),
+            )
+            .order_by(models.Post.id)
+            .limit(batch_size)
+        )
+        posts = result.scalars().all()
+        if not posts:
+            return archived
+        await db.execute(
+            insert(models.ArchivedPost),
+            [
+                {
+                    "id": post.id,
+                    "title": post.title,
+                    "content": post.content,
+                    "user_id": post.user_id,
+                    "created_at": post.created_at,
+                    "level": post.level,
+                    "category": post.category,
+                    "tag_names": ",".join(tag.name for tag in post.tags),
+                }
+                for post in posts
+            ],
+        )
+        # Tag links go with the posts through ON DELETE CASCADE.
+        await db.execute(
+            delete(models.Post).where(models.Post.id.in_([post.id for post in posts]))
+        )
+        await db.commit()
+        db.expunge_all()
+        archived += len(posts)
+
+
+async def optimize_database(db_engine: AsyncEngine):
+    """
+    Return free pages to the OS and refresh query planner statistics.
+    PostgreSQL reclaims space through autovacuum, so only ANALYZE runs there.
+    """
+    async with db_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if conn.dialect.name == "sqlite":
+            if await _sqlite_auto_vacuum_is_incremental(conn):
+                await _sqlite_incremental_vacuum(
+                    conn, settings.incremental_vacuum_pages
+                )
+            # Sample rather than scan whole tables while analyzing.
+            await conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+            await conn.exec_driver_sql("ANALYZE")
+            await conn.exec_driver_sql("PRAGMA optimize")
+        else:
+            await conn.exec_driver_sql("ANALYZE")
+
+
+async def check_auto_vacuum(db_engine: AsyncEngine) -> bool:
+    """
+    Warn if a SQLite database cannot return free pages with incremental
+    vacuum. Returns False in that case, True otherwise.
+    """
+    async with db_engine.connect() as conn:
+        if conn.dialect.name != "sqlite":
+            return True
+        return await _sqlite_auto_vacuum_is_incremental(conn)
+
+
+async def _sqlite_auto_vacuum_is_incremental(conn) -> bool:
+    # Setting auto_vacuum only changes a database that has no tables yet.
+    # Databases created before it was set need one full VACUUM.
+    result = await conn.exec_driver_sql("PRAGMA auto_vacuum")
+    if result.scalar_one() == 2:
+        return True
+    logger.warning(
+        "Incremental vacuum is off for this database, so free pages are "
+        "never returned. Run `python maintenance.py vacuum` once to turn it on."
+    )
+    return False
+
+
+async def _sqlite_incremental_vacuum(conn, pages: int):
+    # SQLite frees one page per step of incremental_vacuum, but SQLAlchemy
+    # only steps statements that return no columns once. Drain it on the
+    # driver's own cursor instead.
+    raw_connection = await conn.get_raw_connection()
+    cursor = await raw_connection.driver_connection.execute(
+        f"PRAGMA incremental_vacuum({int(pages)})"
+    )
+    await cursor.fetchall()
+    await cursor.close()
+
+
+async def full_vacuum(db_engine: AsyncEngine):
+    """
+    Rebuild the whole database file. Slow and locks the database, so it is
+    only run by hand. On SQLite this also switches on incremental vacuum.
+    """
+    async with db_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.exec_driver_sql("VACUUM")
+
+
+async def prune_orphan_blobs(db: AsyncSession) -> int:
+    """
+    Delete stored attachment blobs that no attachment references any more,
+    e.g. after posts were removed by a cascading delete.
+    Returns the number of deleted blobs.
+    """
+    result = await db.execute(select(distinct(models.Attachment.sha256)))
+    referenced = set(result.scalars())
+    cutoff = time.time() - settings.orphan_blob_grace_seconds
+
+    def find_candidates() -> list[str]:
+        return [
+            path.name
+            for path in (settings.upload_dir / "blobs").glob("*/*")
+            if path.name not in referenced and path.stat().st_mtime < cutoff
+        ]
+
+    removed = 0
+    for sha256 in await run_in_threadpool(find_candidates):
+        # An upload may have reused the blob since the snapshot above. Check
+        # again, and let remove_blob skip blobs an upload touched meanwhile.
+        if await count_attachments_by_sha256(sha256, db):
+            continue
+        if await run_in_threadpool(
+            storage.remove_blob, sha256, settings.orphan_blob_grace_seconds
+        ):
+            removed += 1
+    return removed
+
+
+async def get_table_stats(db_engine: AsyncEngine) -> list[dict]:
+    """
+    Return the row count and the table and index sizes (in bytes) of every
+    table. Row counts are estimates on PostgreSQL.
+    """
+    async with db_engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            return await _sqlite_table_stats(conn)
+        result = await conn.execute(
+            text(
+                "SELECT c.relname AS name, c.reltuples::bigint AS rows, "
+                "pg_table_size(c.oid) AS table_bytes, "
+                "pg_indexes_size(c.oid) AS index_bytes "
+                "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relkind = 'r' AND n.nspname = current_schema() "
+                "ORDER BY c.relname"
+            )
+        )
+        return [dict(row) for row in result.mappings()]
+
+
+async def _sqlite_table_stats(conn) -> list[dict]:
+    result = await conn.execute(
+        text("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'")
+    )
+    index_tables = dict(result.all())
+    try:
+        result = await conn.execute(
+            text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+        )
+        sizes = dict(result.all())
+    except OperationalError:
+        # SQLite was built without the dbstat table, so sizes are unknown.
+        sizes = {}
+
+    stats = []
+    for table in Base.metadata.sorted_tables:
+        rows = await conn.scalar(select(func.count()).select_from(table))
+        index_bytes = None
+        if sizes:
+            index_bytes = sum(
+                sizes.get(index, 0)
+                for index, owner in index_tables.items()
+                if owner == table.name
+            )
+        stats.append(
+            {
+                "name": table.name,
+                "rows": rows,
+                "table_bytes": sizes.get(table.name),
+                "index_bytes": index_bytes,
+            }
+        )
+    return stats
+
+
+async def run_maintenance():
+    """Run one full maintenance pass and log what it did."""
+    async with AsyncSessionLocal() as db:
+        if settings.archive_after_days is not None:
+            archived = await archive_old_posts(
+                db,
+                timedelta(days=settings.archive_after_days),
+                settings.archive_batch_size,
+            )
+            logger.info("Archived %d posts.", archived)
+        removed = await prune_orphan_blobs(db)
+        logger.info("Removed %d orphaned attachment blobs.", removed)
+    await optimize_database(engine)
+    for table in await get_table_stats(engine):
+        logger.info(
+            "Table %(name)s: %(rows)s rows, %(table_bytes)s table bytes, "
+            "%(index_bytes)s index bytes.",
+            table,
+        )
+
+
+async def _maintenance_loop(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_maintenance()
+        except Exception:
+            logger.exception("Scheduled database maintenance failed.")
+
+
+def start_maintenance_task():
+    """
+    Schedule run_maintenance every settings.maintenance_interval_seconds.
+    When running several workers, turn the scheduler off on all but one.
+    """
+    global _maintenance_task
+    interval = settings.maintenance_interval_seconds
+    if interval > 0 and _maintenance_task is None:
+        _maintenance_task = asyncio.create_task(_maintenance_loop(interval))
+
+
+async def stop_maintenance_task():
+    """Cancel the scheduled maintenance task, if it was started."""
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        try:
+            await _maintenance_task
+        except asyncio.CancelledError:
+            pass
+        _maintenance_task = None
+
+
+async def _main(command: str):
+    try:
+        match command:
+            case "run":
+                await run_maintenance()
+            case "vacuum":
+                await full_vacuum(engine)
+            case "stats":
+                for table in await get_table_stats(engine):
+                    print(
+                        f"{table['name']}: {table['rows']} rows, "
+                        f"{table['table_bytes']} table bytes, "
+                        f"{table['index_bytes']} index bytes"
+                    )
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database maintenance tasks.")
+    parser.add_argument(
+        "command",
+        choices=["run", "vacuum", "stats"],
+        help="run: one maintenance pass, vacuum: full VACUUM, stats: table sizes",
+    )
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args().command))
@@ -0,0 +1,161 @@
+import logging
+from collections import Counter
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import AddConstraint, CreateTable
+
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _ondelete(rule: str | None) -> str:
+    rule = (rule or "").upper()
+    return "" if rule == "NO ACTION" else rule
+
+
+def _outdated_foreign_keys(inspector, table) -> list[tuple]:
+    """
+    Return (model constraint, reflected foreign key or None) pairs for the
+    foreign keys whose ON DELETE rule differs from the one in the database.
+    """
+    reflected = {
+        tuple(fk["constrained_columns"]): fk
+        for fk in inspector.get_foreign_keys(table.name)
+    }
+    outdated = []
+    for constraint in table.foreign_key_constraints:
+        fk = reflected.get(tuple(constraint.column_keys))
+        current = fk["options"].get("ondelete") if fk else None
+        if fk is None or _ondelete(current) != _ondelete(constraint.ondelete):
+            outdated.append((constraint, fk))
+    return outdated
+
+
+def _create_missing_indexes(conn, table):
+    existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+def _sqlite_needs_rebuild(conn, inspector, table) -> bool:
+    if _outdated_foreign_keys(inspector, table):
+        return True
+    if table.dialect_options["sqlite"]["autoincrement"]:
+        sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": table.name},
+        ).scalar_one()
+        return "AUTOINCREMENT" not in sql.upper()
+    return False
+
+
+def _rebuild_sqlite_table(conn, inspector, table):
+    """
+    Recreate a table from its model and copy the rows over, following
+    SQLite's procedure for schema changes ALTER TABLE cannot make.
+    """
+    # Copy every table so the new table's foreign keys can be resolved.
+    metadata = MetaData()
+    for model_table in Base.metadata.sorted_tables:
+        model_table.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f"_new_{table.name}")
+
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    columns = ", ".join(
+        f'"{column.name}"' for column in table.columns if column.name in existing
+    )
+    conn.execute(CreateTable(new_table))
+    conn.exec_driver_sql(
+        f'INSERT INTO "{new_table.name}" ({columns}) '
+        f'SELECT {columns} FROM "{table.name}"'
+    )
+    conn.exec_driver_sql(f'DROP TABLE "{table.name}"')
+    conn.exec_driver_sql(f'ALTER TABLE "{new_table.name}" RENAME TO "{table.name}"')
+    _create_missing_indexes(conn, table)
+
+
+def _delete_orphaned_rows(conn) -> Counter:
+    """
+    Delete rows whose foreign keys point at missing parents. Old databases
+    never enforced foreign keys, so they may hold such rows, and nothing
+    can reach them. Deleting an orphan can orphan its own children, so
+    check again until nothing is left. Returns the deleted rows per table.
+    """
+    deleted = Counter()
+    while violations := conn.exec_driver_sql("PRAGMA foreign_key_check").all():
+        for table_name, rowid in {(row[0], row[1]) for row in violations}:
+            conn.exec_driver_sql(
+                f'DELETE FROM "{table_name}" WHERE rowid = ?', (rowid,)
+            )
+            deleted[table_name] += 1
+    return deleted
+
+
+def _upgrade_sqlite(conn) -> list[str]:
+    # Foreign keys must be off while tables are swapped, and the pragma
+    # cannot change inside a transaction.
+    conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+    try:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            inspector = inspect(conn)
+            rebuilt = []
+            for table in Base.metadata.sorted_tables:
+                if _sqlite_needs_rebuild(conn, inspector, table):
+                    _rebuild_sqlite_table(conn, inspector, table)
+                    rebuilt.append(table.name)
+                else:
+                    _create_missing_indexes(conn, table)
+            if rebuilt:
+                for table_name, count in _delete_orphaned_rows(conn).items():
+                    logger.warning(
+                        "Deleted %d rows from %s that referenced missing rows.",
+                        count,
+                        table_name,
+                    )
+            conn.exec_driver_sql("COMMIT")
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+    finally:
+        conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+    return rebuilt
+
+
+def _upgrade_generic(conn) -> list[str]:
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    upgraded = []
+    for table in Base.metadata.sorted_tables:
+        outdated = _outdated_foreign_keys(inspector, table)
+        for constraint, fk in outdated:
+            if fk is not None:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"DROP CONSTRAINT {preparer.quote(fk['name'])}"
+                )
+            conn.execute(AddConstraint(constraint))
+        if outdated:
+            upgraded.append(table.name)
+        _create_missing_indexes(conn, table)
+    conn.commit()
+    return upgraded
+
+
+async def upgrade_schema(db_engine: AsyncEngine):
+    """
+    Bring tables created by older versions of the app in line with the
+    models: foreign key ON DELETE rules, SQLite AUTOINCREMENT and indexes.
+    create_all only creates missing tables, so this runs after it at startup.
+    """
+    async with db_engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            upgraded = await conn.run_sync(_upgrade_sqlite)
+        else:
+            upgraded = await conn.run_sync(_upgrade_generic)
+    if upgraded:
+        logger.info("Upgraded tables: %s.", ", ".join(upgraded))
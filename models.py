@@ -2,17 +2,62 @@ from __future__ import annotations
 
 from datetime import UTC, datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Table, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Table,
+    Text,
+    TypeDecorator,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from database import Base
+from enums import Tags
+
+
+class UTCDateTime(TypeDecorator):
+    """
+    Timezone aware DateTime that always stores and returns UTC.
+    SQLite drops the offset on save, so naive values read back are UTC.
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return value
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=UTC)
+        return value.astimezone(UTC)
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=UTC)
+        return value
+
 
 # Association table for many-to-many relationship between Posts and Tags
 post_tag_association = Table(
     "post_tag_association",
     Base.metadata,
-    Column("post_id", Integer, ForeignKey("posts.id"), primary_key=True),
-    Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True),
+    Column(
+        "post_id",
+        Integer,
+        ForeignKey("posts.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "tag_id",
+        Integer,
+        ForeignKey("tags.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    ),
 )
 
 
@@ -32,9 +77,12 @@ class User(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     username: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     email: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
+    # Posts are removed by the database through ON DELETE CASCADE,
+    # so deleting a user never loads their posts.
     posts: Mapped[list[Post]] = relationship(
         back_populates="author",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -53,7 +101,7 @@ class Tag(Base):
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
 
     posts: Mapped[list[Post]] = relationship(
-        secondary=post_tag_association, back_populates="tags"
+        secondary=post_tag_association, back_populates="tags", passive_deletes=True
     )
 
 
@@ -71,22 +119,111 @@ class Post(Base):
         category (str): Category of the post content (max: 50 chars).
         tags (list(str)): List of tags for the post (max: 50 chars per tag).
         author (User): Retrieves the user/author of the post.
+        attachments (list[Attachment]): Files uploaded for the post.
     """
 
     __tablename__ = "posts"
+    # Never reuse the id of a deleted or archived post.
+    __table_args__ = {"sqlite_autoincrement": True}
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(50), nullable=False)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id"), nullable=False, index=True
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True),
+        UTCDateTime(),
         default=lambda: datetime.now(UTC),
+        index=True,
     )
     level: Mapped[str] = mapped_column(String(50), nullable=False)
     category: Mapped[str] = mapped_column(String(50), nullable=False)
     tags: Mapped[list[Tag]] = relationship(
-        secondary=post_tag_association, back_populates="posts"
+        secondary=post_tag_association, back_populates="posts", passive_deletes=True
     )
     author: Mapped[User] = relationship(back_populates="posts")
+    attachments: Mapped[list[Attachment]] = relationship(
+        back_populates="post",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class Attachment(Base):
+    """
+    Represents a file (e.g. an inline image) uploaded for a post.
+    File contents are stored on disk by their sha256 digest, so several
+    attachments can share the same stored blob.
+
+    Attributes:
+        id (int): Unique identifier for the attachment.
+        post_id (int): Foreign key that references the post.
+        filename (str): Original name of the uploaded file (max: 255 chars).
+        content_type (str): MIME type of the file (max: 100 chars).
+        sha256 (str): Hex digest of the file contents.
+        size (int): Size of the file in bytes.
+        has_thumbnail (bool): Whether a thumbnail was generated for the file.
+        created_at (date): Timestamp for the upload.
+        post (Post): Retrieves the post the attachment belongs to.
+    """
+
+    __tablename__ = "attachments"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    post_id: Mapped[int] = mapped_column(
+        ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    content_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    has_thumbnail: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(),
+        default=lambda: datetime.now(UTC),
+    )
+    post: Mapped[Post] = relationship(back_populates="attachments")
+
+
+class ArchivedPost(Base):
+    """
+    Cold storage for old posts moved out of the posts table. Archived posts
+    keep their original id and are read only.
+
+    Attributes:
+        id (int): Original id of the post.
+        title (string): Title of the post (max: 50 chars).
+        content (text): Body content of the post (no char limit).
+        user_id (int): Foreign key that references the author of the post.
+        created_at (date): Timestamp for when the post was created.
+        archived_at (date): Timestamp for when the post was archived.
+        level (str): Experience level for the post (max: 50 chars).
+        category (str): Category of the post content (max: 50 chars).
+        tag_names (text): Comma separated names of the post's tags.
+        author (User): Retrieves the user/author of the post.
+    """
+
+    __tablename__ = "archived_posts"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(50), nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    created_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(),
+        default=lambda: datetime.now(UTC),
+    )
+    level: Mapped[str] = mapped_column(String(50), nullable=False)
+    category: Mapped[str] = mapped_column(String(50), nullable=False)
+    tag_names: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    author: Mapped[User] = relationship()
+
+    @property
+    def tags(self) -> list[Tags]:
+        return [Tags(name) for name in self.tag_names.split(",") if name]
+
+    @property
+    def attachments(self) -> list[Attachment]:
+        # Posts with attachments are never archived.
+        return []
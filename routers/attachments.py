@@ -0,0 +1,81 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+import storage
+from config import settings
+from crud.attachments import count_attachments_by_sha256, get_attachment_by_id
+from database import get_db, get_read_db
+from schemas import AttachmentResponse
+
+router = APIRouter()
+
+# Blobs are content addressed, so a stored file never changes. nosniff stops
+# browsers from treating a file as anything but its stored content type.
+FILE_HEADERS = {
+    "Cache-Control": "public, max-age=31536000, immutable",
+    "X-Content-Type-Options": "nosniff",
+}
+
+
+@router.get("/{attachment_id}", response_model=AttachmentResponse)
+async def get_attachment(
+    attachment_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
+):
+    attachment = await get_attachment_by_id(attachment_id, db)
+    if not attachment:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Attachment not found.")
+    return attachment
+
+
+@router.get("/{attachment_id}/file", name="attachment_file")
+async def get_attachment_file(
+    attachment_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
+):
+    attachment = await get_attachment_by_id(attachment_id, db)
+    if not attachment:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Attachment not found.")
+    # FileResponse handles Range requests and uses sendfile when the server
+    # supports the zero-copy extension.
+    return FileResponse(
+        storage.blob_path(attachment.sha256),
+        media_type=attachment.content_type,
+        filename=attachment.filename,
+        content_disposition_type="inline",
+        headers=FILE_HEADERS,
+    )
+
+
+@router.get("/{attachment_id}/thumbnail", name="attachment_thumbnail")
+async def get_attachment_thumbnail(
+    attachment_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
+):
+    attachment = await get_attachment_by_id(attachment_id, db)
+    if not attachment or not attachment.has_thumbnail:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Thumbnail not found.")
+    return FileResponse(
+        storage.thumbnail_path(attachment.sha256),
+        media_type="image/jpeg",
+        headers=FILE_HEADERS,
+    )
+
+
+@router.delete("/{attachment_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_attachment(
+    attachment_id: int, db: Annotated[AsyncSession, Depends(get_db)]
+):
+    attachment = await get_attachment_by_id(attachment_id, db)
+    if not attachment:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Attachment not found.")
+    sha256 = attachment.sha256
+    await db.delete(attachment)
+    await db.commit()
+    # Only remove the blob once no other attachment shares it. The grace
+    # period covers uploads that reused the blob but have not committed yet.
+    if await count_attachments_by_sha256(sha256, db) == 0:
+        await run_in_threadpool(
+            storage.remove_blob, sha256, settings.orphan_blob_grace_seconds
+        )
@@ -1,16 +1,38 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
-from crud.posts import get_all_posts_from_db, get_post_by_id
+import storage
+from config import settings
+from crud.attachments import get_post_attachments
+from crud.posts import (
+    get_all_posts_from_db,
+    get_archived_post_by_id,
+    get_post_by_id,
+)
 from crud.users import get_user_by_id
-from database import get_db
-from schemas import PostCreate, PostResponse, PostUpdate
+from database import get_db, get_read_db
+from schemas import AttachmentResponse, PostCreate, PostResponse, PostUpdate
 from utils import get_db_tags
 
-router = APIRouter()
+router = APIRouter(route_class=storage.UploadLimitRoute)
+
+
+async def _get_editable_post(post_id: int, db: AsyncSession) -> models.Post:
+    """
+    Return the post to change. Raise 409 for archived posts, which are
+    read only, and 404 for posts that do not exist.
+    """
+    post = await get_post_by_id(post_id, db)
+    if post:
+        return post
+    if await get_archived_post_by_id(post_id, db):
+        raise HTTPException(
+            status.HTTP_409_CONFLICT, detail="Archived posts are read only."
+        )
+    raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Post not found.")
 
 
 @router.post(
@@ -38,14 +60,16 @@ async def create_post(post: PostCreate, db: Annotated[AsyncSession, Depends(get_
 
 
 @router.get("", response_model=list[PostResponse])
-async def get_posts(db: Annotated[AsyncSession, Depends(get_db)]):
+async def get_posts(db: Annotated[AsyncSession, Depends(get_read_db)]):
     posts = await get_all_posts_from_db(db)
     return posts
 
 
 @router.get("/{post_id}", response_model=PostResponse)
-async def get_post(post_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
+async def get_post(post_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]):
     post = await get_post_by_id(post_id, db)
+    if not post:
+        post = await get_archived_post_by_id(post_id, db)
     if post:
         return post
     raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Post not found.")
@@ -58,9 +82,7 @@ async def get_post(post_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
 async def update_post_full(
     post_id: int, post_data: PostCreate, db: Annotated[AsyncSession, Depends(get_db)]
 ):
-    post = await get_post_by_id(post_id, db)
-    if not post:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Post not found.")
+    post = await _get_editable_post(post_id, db)
     # Prevent post categories from being changed.
     if post_data.category.value != post.category:
         raise HTTPException(
@@ -86,9 +108,7 @@ async def update_post_full(
 async def update_post_partial(
     post_id: int, post_data: PostUpdate, db: Annotated[AsyncSession, Depends(get_db)]
 ):
-    post = await get_post_by_id(post_id, db)
-    if not post:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Post not found.")
+    post = await _get_editable_post(post_id, db)
     update_data = post_data.model_dump(exclude_unset=True)
     if "category" in update_data:
         raise HTTPException(
@@ -110,7 +130,61 @@ async def update_post_partial(
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(post_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
     post = await get_post_by_id(post_id, db)
+    if not post:
+        post = await get_archived_post_by_id(post_id, db)
     if not post:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Post not found.")
     await db.delete(post)
     await db.commit()
+
+
+@router.post(
+    "/{post_id}/attachments",
+    response_model=AttachmentResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_attachment(
+    post_id: int, file: UploadFile, db: Annotated[AsyncSession, Depends(get_db)]
+):
+    post = await get_post_by_id(post_id, db)
+    if not post:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Post not found.")
+    if file.content_type not in settings.allowed_upload_types:
+        raise HTTPException(
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Unsupported attachment type.",
+        )
+    try:
+        sha256, size = await storage.save_upload(file)
+    except storage.UploadTooLargeError:
+        raise HTTPException(
+            status.HTTP_413_CONTENT_TOO_LARGE,
+            detail="Attachment is too large.",
+        )
+    except storage.InvalidImageError:
+        raise HTTPException(
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Attachment is not a valid image of its declared type.",
+        )
+    new_attachment = models.Attachment(
+        post_id=post_id,
+        filename=file.filename or sha256,
+        content_type=file.content_type,
+        sha256=sha256,
+        size=size,
+        has_thumbnail=await storage.make_thumbnail(sha256),
+    )
+    db.add(new_attachment)
+    await db.commit()
+    await db.refresh(new_attachment)
+    return new_attachment
+
+
+@router.get("/{post_id}/attachments", response_model=list[AttachmentResponse])
+async def get_attachments(
+    post_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
+):
+    post = await get_post_by_id(post_id, db)
+    if not post:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Post not found.")
+    return await get_post_attachments(post_id, db)
@@ -7,7 +7,7 @@ from sqlalchemy.orm import selectinload
 
 import models
 from crud.users import get_user_by_email, get_user_by_id, get_user_by_username
-from database import get_db
+from database import get_db, get_read_db
 from schemas import PostResponse, UserCreate, UserResponse, UserUpdate
 
 router = APIRouter()
@@ -34,7 +34,7 @@ async def create_user(user: UserCreate, db: Annotated[AsyncSession, Depends(get_
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
+async def get_user(user_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]):
     user = await get_user_by_id(user_id, db)
     if not user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Could not find user.")
@@ -80,7 +80,9 @@ async def update_user(
 
 
 @router.get("/{user_id}/posts", response_model=list[PostResponse])
-async def get_user_posts(user_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
+async def get_user_posts(
+    user_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
+):
     user = await get_user_by_id(user_id, db)
     if not user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found.")
@@ -51,7 +51,7 @@ class PostCreate(PostBase):
 class PostUpdate(BaseModel):
     """Update (optional) fields for a post object."""
 
-    title: str | None = Field(default=None, min_length=2, max_length=100)
+    title: str | None = Field(default=None, min_length=2, max_length=50)
     content: str | None = Field(default=None, min_length=2)
     level: Level | None
     category: Category | None = None
@@ -88,3 +88,17 @@ class PostResponse(PostBase):
         ):
             return [Tags(tag.name) for tag in value]
         return value
+
+
+class AttachmentResponse(BaseModel):
+    """Defines the attachment data returned by the api."""
+
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    post_id: int
+    filename: str
+    content_type: str
+    sha256: str
+    size: int
+    has_thumbnail: bool
+    created_at: datetime
@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+
+# Process pool used for CPU bound image work. Created in the app lifespan.
+_thumbnail_pool: ProcessPoolExecutor | None = None
+
+# Room for multipart boundaries and part headers on top of the file itself.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds settings.max_upload_bytes."""
+
+
+class InvalidImageError(Exception):
+    """Raised when an upload is not a readable image of its declared type."""
+
+
+def _upload_too_large() -> HTTPException:
+    return HTTPException(
+        status.HTTP_413_CONTENT_TOO_LARGE, detail="Attachment is too large."
+    )
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Route class that rejects multipart bodies larger than the upload limit
+    before they are spooled to disk. Checks Content-Length up front and
+    counts the bytes as the body streams in, for requests without one.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request):
+            content_type = request.headers.get("content-type", "")
+            if not content_type.startswith("multipart/form-data"):
+                return await handler(request)
+            limit = settings.max_upload_bytes + MULTIPART_OVERHEAD_BYTES
+            content_length = request.headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > limit:
+                raise _upload_too_large()
+
+            received = 0
+            receive = request.receive
+
+            async def limited_receive():
+                nonlocal received
+                message = await receive()
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _upload_too_large()
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
+
+
+def _warm_up():
+    from PIL import Image
+
+    Image.init()
+
+
+def start_thumbnail_pool():
+    """
+    Create the process pool that checks and resizes images, and start its
+    workers now so the first upload does not wait for them.
+    """
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        workers = settings.thumbnail_workers or os.process_cpu_count() or 1
+        # Forking a process that already runs threads can deadlock the child.
+        # Workers fork from a server that has this module and Pillow loaded.
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__, "PIL.Image"])
+        _thumbnail_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        for _ in range(workers):
+            _thumbnail_pool.submit(_warm_up)
+
+
+def shutdown_thumbnail_pool():
+    """Shut down the thumbnail process pool, if it was started."""
+    global _thumbnail_pool
+    if _thumbnail_pool is not None:
+        _thumbnail_pool.shutdown(cancel_futures=True)
+        _thumbnail_pool = None
+
+
+async def _run_in_pool(func, *args):
+    pool = _thumbnail_pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed while decoding a huge image), which
+        # breaks the whole pool. Replace it so later uploads still work.
+        if pool is not None and pool is _thumbnail_pool:
+            shutdown_thumbnail_pool()
+            start_thumbnail_pool()
+        raise
+
+
+def blob_path(sha256: str) -> Path:
+    """Return the content addressed path for a stored blob."""
+    return settings.upload_dir / "blobs" / sha256[:2] / sha256
+
+
+def thumbnail_path(sha256: str) -> Path:
+    """Return the path of the JPEG thumbnail generated for a blob."""
+    return settings.upload_dir / "thumbs" / sha256[:2] / f"{sha256}.jpg"
+
+
+def _open_temp_file():
+    tmp_dir = settings.upload_dir / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+
+
+def _commit_blob(tmp_name: str, sha256: str):
+    """Move a finished temp file into place, or drop it if the blob exists."""
+    dest = blob_path(sha256)
+    try:
+        # Touch the existing blob so pruning treats it as fresh until the
+        # attachment row that reuses it is committed.
+        os.utime(dest)
+    except FileNotFoundError:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, dest)
+    else:
+        os.unlink(tmp_name)
+
+
+def _identify_image(path: str, max_pixels: int) -> str | None:
+    """
+    Return the MIME type Pillow detects for an image file, or None if the
+    file is not a readable image within max_pixels. Runs inside a worker.
+    """
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with Image.open(path) as img:
+            if img.width * img.height > max_pixels:
+                return None
+            mime_type = img.get_format_mimetype()
+            img.verify()
+    except (Image.DecompressionBombError, OSError, ValueError, SyntaxError):
+        return None
+    return mime_type
+
+
+async def save_upload(upload: UploadFile) -> tuple[str, int]:
+    """
+    Copy an upload to disk in chunks while hashing it, and store it under
+    its sha256 digest once it is confirmed to be an image of its declared
+    content type. Identical files are only stored once.
+    Returns the (sha256, size) of the stored blob.
+    """
+    tmp = await run_in_threadpool(_open_temp_file)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await upload.read(settings.upload_chunk_bytes):
+            size += len(chunk)
+            if size > settings.max_upload_bytes:
+                raise UploadTooLargeError
+            hasher.update(chunk)
+            await run_in_threadpool(tmp.write, chunk)
+        await run_in_threadpool(tmp.close)
+        mime_type = await _run_in_pool(
+            _identify_image, tmp.name, settings.max_image_pixels
+        )
+        if mime_type != upload.content_type:
+            raise InvalidImageError
+        sha256 = hasher.hexdigest()
+        await run_in_threadpool(_commit_blob, tmp.name, sha256)
+    except BaseException:
+        tmp.close()
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
+    return sha256, size
+
+
+def _render_thumbnail(src: str, dest: str, size: int, max_pixels: int) -> bool:
+    """Resize an image into a JPEG thumbnail. Runs inside a worker process."""
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    # Uploads of the same image may render at the same time, so each render
+    # writes its own temp file and the last rename wins.
+    fd, tmp_dest = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, Image.open(src) as img:
+            img.thumbnail((size, size))
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.save(out, "JPEG", quality=85)
+        os.replace(tmp_dest, dest)
+    except (Image.DecompressionBombError, OSError, ValueError):
+        return os.path.exists(dest)
+    finally:
+        Path(tmp_dest).unlink(missing_ok=True)
+    return True
+
+
+async def make_thumbnail(sha256: str) -> bool:
+    """
+    Render the thumbnail for a blob in the process pool.
+    Returns False if the blob could not be read as an image.
+    """
+    dest = thumbnail_path(sha256)
+    if dest.exists():
+        return True
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        return await _run_in_pool(
+            _render_thumbnail,
+            str(blob_path(sha256)),
+            str(dest),
+            settings.thumbnail_size,
+            settings.max_image_pixels,
+        )
+    except BrokenProcessPool:
+        # The blob is already stored, so keep the attachment without one.
+        return False
+
+
+def remove_blob(sha256: str, grace_seconds: float = 0) -> bool:
+    """
+    Delete a blob and its thumbnail from disk, unless an upload wrote or
+    reused the blob within the last `grace_seconds`.
+    Returns whether the blob was removed.
+    """
+    path = blob_path(sha256)
+    try:
+        if path.stat().st_mtime > time.time() - grace_seconds:
+            return False
+    except FileNotFoundError:
+        pass
+    path.unlink(missing_ok=True)
+    thumbnail_path(sha256).unlink(missing_ok=True)
+    return True
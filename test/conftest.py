@@ -0,0 +1,89 @@
+import asyncio
+import io
+import os
+import tempfile
+
+import pytest
+from PIL import Image
+
+# The app builds its engine from settings at import time, so point it at a
+# throwaway database before anything imports it. BLOG_TEST_DATABASE_URL
+# runs the suite against another backend, e.g. a Postgres container.
+_tmp_dir = tempfile.mkdtemp(prefix="blog-test-")
+os.environ["BLOG_DATABASE_URL"] = os.environ.get(
+    "BLOG_TEST_DATABASE_URL", f"sqlite+aiosqlite:///{_tmp_dir}/app.db"
+)
+os.environ["BLOG_MAINTENANCE_INTERVAL_SECONDS"] = "0"
+os.environ["BLOG_THUMBNAIL_WORKERS"] = "1"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import admission  # noqa: E402
+from config import settings  # noqa: E402
+from database import Base, dispose_engines, engine  # noqa: E402
+from main import app  # noqa: E402
+
+
+async def _reset_database():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    # Connections belong to this event loop, the test client runs its own.
+    await dispose_engines()
+
+
+@pytest.fixture
+def database():
+    """Start from an empty database. The app creates the tables."""
+    asyncio.run(_reset_database())
+
+
+@pytest.fixture
+def client(database, tmp_path, monkeypatch):
+    """Test client for a fresh database and upload directory."""
+    monkeypatch.setattr(settings, "upload_dir", tmp_path / "uploads")
+    monkeypatch.setattr(
+        admission,
+        "rate_limiter",
+        admission.RateLimiter(settings.rate_limit_max_clients),
+    )
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user(client):
+    response = client.post(
+        "/api/users", json={"username": "testuser", "email": "test@example.com"}
+    )
+    return response.json()
+
+
+@pytest.fixture
+def post(client, user):
+    response = client.post(
+        "/api/posts",
+        json={
+            "title": "Learning FastAPI",
+            "content": "FastAPI is great for building APIs.",
+            "level": "Beginner",
+            "category": "FastAPI",
+            "tags": ["Tips"],
+            "user_id": user["id"],
+        },
+    )
+    return response.json()
+
+
+def make_png(size=(64, 48), color="red") -> bytes:
+    """Return a solid color PNG image."""
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def upload(client, post_id, data, content_type="image/png", filename="image.png"):
+    """Upload data as an attachment of the post."""
+    return client.post(
+        f"/api/posts/{post_id}/attachments",
+        files={"file": (filename, data, content_type)},
+    )
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+import admission
+from admission import ConcurrencyLimiter, LoadShedError, TokenBucket
+from config import settings
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=1, capacity=2)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 1
+
+    # Pretend a second went by.
+    bucket.updated_at -= 1
+    assert bucket.try_acquire() == 0
+
+
+def test_rate_limiter_drops_least_recently_used_bucket():
+    limiter = admission.RateLimiter(max_keys=2)
+
+    limiter.try_acquire(("a",), 60, 1)
+    limiter.try_acquire(("b",), 60, 1)
+    limiter.try_acquire(("a",), 60, 1)
+    limiter.try_acquire(("c",), 60, 1)
+
+    assert list(limiter._buckets) == [("a",), ("c",)]
+
+
+def test_concurrency_limiter_sheds_when_queue_is_full():
+    async def run():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=0, queue_timeout=1)
+        async with limiter.slot():
+            with pytest.raises(LoadShedError):
+                async with limiter.slot():
+                    pass
+        async with limiter.slot():
+            pass
+
+    asyncio.run(run())
+
+
+def test_concurrency_limiter_sheds_after_queue_timeout():
+    async def run():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, queue_timeout=0.01)
+        async with limiter.slot():
+            with pytest.raises(LoadShedError):
+                async with limiter.slot():
+                    pass
+        assert limiter._waiting == 0
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def strict_rate_limit(monkeypatch):
+    monkeypatch.setattr(settings, "client_rate_per_minute", 1)
+    monkeypatch.setattr(settings, "client_rate_burst", 2)
+
+
+def test_api_route_is_rate_limited(client, strict_rate_limit):
+    assert client.get("/api/posts").status_code == 200
+    assert client.get("/api/posts").status_code == 200
+
+    response = client.get("/api/posts")
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert response.json()["detail"] == "Too many requests. Please slow down."
+
+
+def test_html_route_is_rate_limited(client, strict_rate_limit):
+    client.get("/")
+    client.get("/")
+
+    response = client.get("/")
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert response.headers["content-type"].startswith("text/html")
+    assert "Too many requests. Please slow down." in response.text
+
+
+def test_write_route_is_shed_while_slot_is_held(client, user, monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, max_queue=1, queue_timeout=0.05)
+    monkeypatch.setattr(admission, "db_write_limiter", limiter)
+
+    # Hold the only write slot on the app's event loop.
+    with client.portal.wrap_async_context_manager(limiter.slot()):
+        response = client.patch(
+            f"/api/users/{user['id']}", json={"username": "renamed"}
+        )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.shed_retry_after_seconds)
+    assert client.get(f"/api/users/{user['id']}").json()["username"] == "testuser"
+
+
+def test_uploads_do_not_hold_the_write_slot(client, post, monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, max_queue=0, queue_timeout=0.05)
+    monkeypatch.setattr(admission, "upload_limiter", limiter)
+
+    # A slow upload holds the only upload slot.
+    with client.portal.wrap_async_context_manager(limiter.slot()):
+        upload = client.post(
+            f"/api/posts/{post['id']}/attachments",
+            files={"file": ("image.png", b"data", "image/png")},
+        )
+        write = client.patch(
+            f"/api/users/{post['user_id']}", json={"username": "renamed"}
+        )
+
+    assert upload.status_code == 503
+    assert write.status_code == 200
@@ -0,0 +1,175 @@
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+import storage
+from config import settings
+from conftest import make_png, upload
+
+
+def stored_blobs():
+    return list((settings.upload_dir / "blobs").glob("*/*"))
+
+
+def test_upload_is_saved_in_chunks_and_deduplicated(client, post, monkeypatch):
+    monkeypatch.setattr(settings, "upload_chunk_bytes", 7)
+    data = make_png()
+
+    first = upload(client, post["id"], data)
+    second = upload(client, post["id"], data, filename="copy.png")
+
+    assert first.status_code == 201
+    assert second.status_code == 201
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert first.json()["sha256"] == second.json()["sha256"] == sha256
+    assert first.json()["size"] == len(data)
+    assert stored_blobs() == [storage.blob_path(sha256)]
+    assert storage.blob_path(sha256).read_bytes() == data
+    assert not list((settings.upload_dir / "tmp").iterdir())
+
+
+def test_upload_too_large(client, post, monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_bytes", 100)
+
+    response = upload(client, post["id"], make_png(size=(256, 256), color="blue"))
+
+    assert response.status_code == 413
+    assert not stored_blobs()
+
+
+def test_upload_body_too_large_is_rejected_before_parsing(client, post, monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_bytes", 100)
+    body = b"x" * (storage.MULTIPART_OVERHEAD_BYTES + 1024)
+
+    response = upload(client, post["id"], body)
+
+    assert response.status_code == 413
+    assert not (settings.upload_dir / "tmp").exists()
+
+
+def test_upload_unsupported_type(client, post):
+    response = upload(client, post["id"], b"hello", "text/plain", "notes.txt")
+
+    assert response.status_code == 415
+
+
+def test_upload_not_matching_declared_type(client, post):
+    html = upload(client, post["id"], b"<html>hi</html>")
+    jpeg_as_png = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(jpeg_as_png, "JPEG")
+    mismatched = upload(client, post["id"], jpeg_as_png.getvalue())
+
+    assert html.status_code == 415
+    assert mismatched.status_code == 415
+    assert not stored_blobs()
+
+
+def test_decompression_bomb_is_rejected(client, post, monkeypatch):
+    monkeypatch.setattr(settings, "max_image_pixels", 1000)
+
+    response = upload(client, post["id"], make_png(size=(200, 200)))
+
+    assert response.status_code == 415
+    assert not stored_blobs()
+
+
+def test_render_thumbnail_handles_decompression_bomb(tmp_path, monkeypatch):
+    # The worker sets Pillow's global pixel limit, restore it afterwards.
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", Image.MAX_IMAGE_PIXELS)
+    src = tmp_path / "bomb.png"
+    src.write_bytes(make_png(size=(200, 200)))
+    dest = tmp_path / "thumb.jpg"
+
+    assert storage._render_thumbnail(str(src), str(dest), 32, 1000) is False
+    assert list(tmp_path.iterdir()) == [src]
+
+
+def test_concurrent_renders_of_one_thumbnail(tmp_path, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", Image.MAX_IMAGE_PIXELS)
+    src = tmp_path / "image.png"
+    src.write_bytes(make_png(size=(800, 400)))
+    dest = tmp_path / "thumb.jpg"
+    args = (str(src), str(dest), 32, settings.max_image_pixels)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: storage._render_thumbnail(*args), range(32)))
+
+    assert all(results)
+    assert sorted(tmp_path.iterdir()) == [src, dest]
+
+
+def test_thumbnail_is_generated(client, post):
+    attachment = upload(client, post["id"], make_png(size=(800, 400))).json()
+
+    response = client.get(f"/api/attachments/{attachment['id']}/thumbnail")
+
+    assert attachment["has_thumbnail"] is True
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    with Image.open(io.BytesIO(response.content)) as thumbnail:
+        assert max(thumbnail.size) == settings.thumbnail_size
+
+
+def test_thumbnail_pool_is_replaced_after_a_worker_dies(client, post):
+    with pytest.raises(BrokenProcessPool):
+        client.portal.call(storage._run_in_pool, os._exit, 1)
+
+    response = upload(client, post["id"], make_png())
+
+    assert response.status_code == 201
+    assert response.json()["has_thumbnail"] is True
+
+
+def test_file_supports_range_requests(client, post):
+    data = make_png()
+    attachment = upload(client, post["id"], data).json()
+
+    full = client.get(f"/api/attachments/{attachment['id']}/file")
+    partial = client.get(
+        f"/api/attachments/{attachment['id']}/file", headers={"Range": "bytes=0-9"}
+    )
+
+    assert full.status_code == 200
+    assert full.content == data
+    assert full.headers["x-content-type-options"] == "nosniff"
+    assert partial.status_code == 206
+    assert partial.content == data[:10]
+
+
+def test_delete_removes_blob_once_unreferenced(client, post, monkeypatch):
+    monkeypatch.setattr(settings, "orphan_blob_grace_seconds", 0)
+    data = make_png()
+    first = upload(client, post["id"], data).json()
+    second = upload(client, post["id"], data).json()
+    path = storage.blob_path(first["sha256"])
+
+    assert client.delete(f"/api/attachments/{first['id']}").status_code == 204
+    assert path.exists()
+    assert client.delete(f"/api/attachments/{second['id']}").status_code == 204
+    assert not path.exists()
+    assert not storage.thumbnail_path(first["sha256"]).exists()
+    assert client.get(f"/api/attachments/{second['id']}").status_code == 404
+
+
+def test_delete_keeps_recently_uploaded_blob(client, post):
+    attachment = upload(client, post["id"], make_png()).json()
+
+    assert client.delete(f"/api/attachments/{attachment['id']}").status_code == 204
+    # A concurrent upload may be about to reference it, so pruning cleans up.
+    assert storage.blob_path(attachment["sha256"]).exists()
+
+
+def test_duplicate_upload_refreshes_blob_mtime(client, post):
+    data = make_png()
+    sha256 = upload(client, post["id"], data).json()["sha256"]
+    path = storage.blob_path(sha256)
+    os.utime(path, (0, 0))
+
+    assert upload(client, post["id"], data).status_code == 201
+    assert path.stat().st_mtime > time.time() - 60
@@ -1,61 +1,121 @@
-from sqlalchemy.orm import Session
-from database import engine, Base, SessionLocal
-from models import User, Post, Tag
-from enums import Level, Category
+import asyncio
 
-# Recreate the database (for testing purposes)
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import selectinload
 
+import utils
+from database import AsyncSessionLocal, Base, build_engine, engine
+from enums import Category, Level, Tags
+from models import Post, Tag, User
 
-def test_tags():
-    db: Session = SessionLocal()
 
+async def run_tags_test():
+    # Recreate the database (for testing purposes)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            # 1. Create a user
+            user = User(username="testuser", email="test@example.com")
+            db.add(user)
+            await db.commit()
+            await db.refresh(user)
+
+            # 2. Create tags
+            tag1 = Tag(name="Python")
+            tag2 = Tag(name="FastAPI")
+            db.add_all([tag1, tag2])
+            await db.commit()
+
+            # 3. Create a post with tags
+            post = Post(
+                title="Learning FastAPI",
+                content="FastAPI is great for building APIs.",
+                author=user,
+                level=Level.BEGINNER.value,
+                category=Category.FASTAPI.value,
+                tags=[tag1, tag2],
+            )
+            db.add(post)
+            await db.commit()
+            await db.refresh(post, attribute_names=["tags", "created_at"])
+
+            print(f"Created Post ID: {post.id}")
+            print(f"Post Tags: {[tag.name for tag in post.tags]}")
+
+            # 4. Verify Many-to-Many
+            # Check if tag1 has the post
+            result = await db.execute(
+                select(Tag).options(selectinload(Tag.posts)).where(Tag.id == tag1.id)
+            )
+            tag1 = result.scalars().one()
+            print(
+                f"Tag '{tag1.name}' associated posts: {[p.title for p in tag1.posts]}"
+            )
+
+            assert len(post.tags) == 2
+            assert "Python" in [t.name for t in post.tags]
+            assert "FastAPI" in [t.name for t in post.tags]
+            assert len(tag1.posts) == 1
+            # created_at comes back timezone aware on every backend.
+            assert post.created_at.tzinfo is not None
+
+            print("\nVerification Successful!")
+    finally:
+        await engine.dispose()
+
+
+def test_tags(database):
+    asyncio.run(run_tags_test())
+
+
+def test_seed_tags_without_upsert_support(client, monkeypatch):
+    # Dialects without ON CONFLICT fall back to inserting only missing tags.
+    monkeypatch.setattr(utils, "insert_ignore_conflicts", lambda *args: None)
+
+    async def seed_twice():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Tag).where(Tag.name == Tags.TIPS.value))
+            await db.commit()
+            await utils.seed_tags(db)
+            await utils.seed_tags(db)
+            result = await db.execute(select(Tag.name))
+            return sorted(result.scalars())
+
+    assert client.portal.call(seed_twice) == sorted(tag.value for tag in Tags)
+
+
+def test_get_routes_read_from_the_replica(client, user, tmp_path, monkeypatch):
+    replica = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+
+    async def create_replica():
+        async with replica.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(
+                User.__table__.insert().values(
+                    id=user["id"], username="replica", email="replica@example.com"
+                )
+            )
+
+    client.portal.call(create_replica)
+    monkeypatch.setattr(
+        "database.ReadSessionLocal",
+        async_sessionmaker(replica, class_=AsyncSession, expire_on_commit=False),
+    )
     try:
-        # 1. Create a user
-        user = User(username="testuser", email="test@example.com")
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-        # 2. Create tags
-        tag1 = Tag(name="Python")
-        tag2 = Tag(name="FastAPI")
-        db.add_all([tag1, tag2])
-        db.commit()
-        db.refresh(tag1)
-        db.refresh(tag2)
-
-        # 3. Create a post with tags
-        post = Post(
-            title="Learning FastAPI",
-            content="FastAPI is great for building APIs.",
-            author=user,
-            level=Level.BEGINNER.value,
-            category=Category.FASTAPI.value,
-            tags=[tag1, tag2],
-        )
-        db.add(post)
-        db.commit()
-        db.refresh(post)
-
-        print(f"Created Post ID: {post.id}")
-        print(f"Post Tags: {[tag.name for tag in post.tags]}")
-
-        # 4. Verify Many-to-Many
-        # Check if tag1 has the post
-        print(f"Tag '{tag1.name}' associated posts: {[p.title for p in tag1.posts]}")
-
-        assert len(post.tags) == 2
-        assert "Python" in [t.name for t in post.tags]
-        assert "FastAPI" in [t.name for t in post.tags]
-        assert len(tag1.posts) == 1
-
-        print("\nVerification Successful!")
+        user_url = f"/api/users/{user['id']}"
+        assert client.get(user_url).json()["username"] == "replica"
 
+        # Writes go to the primary, so the replica still has the old row.
+        response = client.patch(user_url, json={"username": "renamed"})
+        assert response.json()["username"] == "renamed"
+        assert client.get(user_url).json()["username"] == "replica"
     finally:
-        db.close()
+        client.portal.call(replica.dispose)
 
 
 if __name__ == "__main__":
-    test_tags()
+    asyncio.run(run_tags_test())
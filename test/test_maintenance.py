@@ -0,0 +1,186 @@
+import asyncio
+import os
+import sqlite3
+from contextlib import closing
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func, insert, select, update
+
+import maintenance
+import models
+import storage
+from config import settings
+from conftest import make_png, upload
+from database import AsyncSessionLocal, Base, build_engine, engine
+
+sqlite_only = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="SQLite specific maintenance"
+)
+
+
+async def _freelist_count() -> int:
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql("PRAGMA freelist_count")
+        return result.scalar_one()
+
+
+@sqlite_only
+def test_optimize_database_returns_free_pages(client, user):
+    async def fill_and_delete():
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                insert(models.Post),
+                [
+                    {
+                        "title": f"Post {i}",
+                        "content": "x" * 4000,
+                        "user_id": user["id"],
+                        "level": "Beginner",
+                        "category": "FastAPI",
+                    }
+                    for i in range(200)
+                ],
+            )
+            await db.commit()
+            await db.execute(delete(models.Post))
+            await db.commit()
+        return await _freelist_count()
+
+    before = client.portal.call(fill_and_delete)
+    client.portal.call(maintenance.optimize_database, engine)
+    after = client.portal.call(_freelist_count)
+
+    assert before > 100
+    assert after == 0
+
+
+def _age_posts(days: int):
+    async def age():
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.Post).values(
+                    created_at=datetime.now(UTC) - timedelta(days=days)
+                )
+            )
+            await db.commit()
+
+    return age
+
+
+async def _archive(older_than: timedelta) -> int:
+    async with AsyncSessionLocal() as db:
+        return await maintenance.archive_old_posts(db, older_than, batch_size=1)
+
+
+def test_archive_old_posts_moves_old_posts(client, post):
+    client.portal.call(_age_posts(400))
+    recent = client.post(
+        "/api/posts",
+        json={
+            "title": "Recent",
+            "content": "Content",
+            "level": "Beginner",
+            "category": "FastAPI",
+            "tags": [],
+            "user_id": post["author"]["id"],
+        },
+    ).json()
+
+    assert client.portal.call(_archive, timedelta(days=365)) == 1
+    assert [p["id"] for p in client.get("/api/posts").json()] == [recent["id"]]
+
+    archived = client.get(f"/api/posts/{post['id']}")
+    assert archived.status_code == 200
+    assert archived.json()["tags"] == ["Tips"]
+    assert client.get(f"/posts/{post['id']}").status_code == 200
+
+
+def test_archived_post_is_read_only_but_deletable(client, post):
+    client.portal.call(_age_posts(400))
+    client.portal.call(_archive, timedelta(days=365))
+
+    response = client.patch(
+        f"/api/posts/{post['id']}",
+        json={"title": "New", "level": None, "tags": None},
+    )
+    assert response.status_code == 409
+
+    assert client.delete(f"/api/posts/{post['id']}").status_code == 204
+    assert client.get(f"/api/posts/{post['id']}").status_code == 404
+
+
+async def _prune() -> int:
+    async with AsyncSessionLocal() as db:
+        return await maintenance.prune_orphan_blobs(db)
+
+
+def test_prune_orphan_blobs_removes_only_stale_unreferenced_blobs(client, post):
+    kept = upload(client, post["id"], make_png(color="red")).json()
+    stale = upload(client, post["id"], make_png(color="green")).json()
+    fresh = upload(client, post["id"], make_png(color="blue")).json()
+    for attachment in (stale, fresh):
+        client.delete(f"/api/attachments/{attachment['id']}")
+    for attachment in (kept, stale):
+        os.utime(storage.blob_path(attachment["sha256"]), (0, 0))
+
+    assert client.portal.call(_prune) == 1
+    assert storage.blob_path(kept["sha256"]).exists()
+    assert storage.blob_path(fresh["sha256"]).exists()
+    assert not storage.blob_path(stale["sha256"]).exists()
+    assert not storage.thumbnail_path(stale["sha256"]).exists()
+
+
+def test_user_delete_cascades_in_the_database(client, post, monkeypatch):
+    monkeypatch.setattr(settings, "orphan_blob_grace_seconds", 0)
+    attachment = upload(client, post["id"], make_png(color="red")).json()
+
+    assert client.delete(f"/api/users/{post['user_id']}").status_code == 204
+
+    async def count(table) -> int:
+        async with engine.connect() as conn:
+            return await conn.scalar(select(func.count()).select_from(table))
+
+    for table in (models.Post, models.Attachment, models.post_tag_association):
+        assert client.portal.call(count, table) == 0
+    assert client.portal.call(count, models.Tag) > 0
+
+    assert client.portal.call(_prune) == 1
+    assert not storage.blob_path(attachment["sha256"]).exists()
+
+
+@sqlite_only
+def test_get_table_stats_counts_rows(client, post):
+    stats = client.portal.call(maintenance.get_table_stats, engine)
+    by_name = {entry["name"]: entry for entry in stats}
+
+    assert set(by_name) == {table.name for table in Base.metadata.sorted_tables}
+    assert by_name["users"]["rows"] == 1
+    assert by_name["posts"]["rows"] == 1
+    assert by_name["post_tag_association"]["rows"] == 1
+    # Sizes are only known when SQLite was built with the dbstat table.
+    if by_name["posts"]["table_bytes"] is not None:
+        assert by_name["posts"]["table_bytes"] > 0
+        assert by_name["posts"]["index_bytes"] > 0
+
+
+def test_full_vacuum_turns_on_incremental_vacuum(tmp_path, caplog):
+    path = tmp_path / "old.db"
+    # A database created without auto_vacuum, like those of older versions.
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY)")
+
+    async def check_before_and_after_vacuum():
+        db_engine = build_engine(f"sqlite+aiosqlite:///{path}")
+        try:
+            before = await maintenance.check_auto_vacuum(db_engine)
+            await maintenance.full_vacuum(db_engine)
+            return before, await maintenance.check_auto_vacuum(db_engine)
+        finally:
+            await db_engine.dispose()
+
+    before, after = asyncio.run(check_before_and_after_vacuum())
+
+    assert before is False
+    assert "maintenance.py vacuum" in caplog.text
+    assert after is True
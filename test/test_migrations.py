@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+import migrations
+from database import Base, dispose_engines, engine
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="Uses the SQLite schema of old versions"
+)
+
+# Schema and data as created by the first version of the app, before foreign
+# keys cascaded or were enforced.
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL,
+    username VARCHAR(50) NOT NULL,
+    email VARCHAR(120) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (username),
+    UNIQUE (email)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE TABLE tags (
+    id INTEGER NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE INDEX ix_tags_id ON tags (id);
+CREATE TABLE posts (
+    id INTEGER NOT NULL,
+    title VARCHAR(50) NOT NULL,
+    content TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    created_at DATETIME NOT NULL,
+    level VARCHAR(50) NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_posts_user_id ON posts (user_id);
+CREATE INDEX ix_posts_id ON posts (id);
+CREATE TABLE post_tag_association (
+    post_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (post_id, tag_id),
+    FOREIGN KEY(post_id) REFERENCES posts (id),
+    FOREIGN KEY(tag_id) REFERENCES tags (id)
+);
+INSERT INTO users VALUES (1, 'legacy', 'legacy@example.com');
+INSERT INTO tags VALUES (1, 'Tips');
+INSERT INTO posts VALUES
+    (1, 'First', 'Content', 1, '2024-01-01 00:00:00.000000', 'Beginner', 'FastAPI'),
+    (2, 'Second', 'Content', 1, '2024-01-02 00:00:00.000000', 'Beginner', 'FastAPI'),
+    (3, 'Orphan', 'Content', 42, '2024-01-03 00:00:00.000000', 'Beginner', 'FastAPI');
+INSERT INTO post_tag_association VALUES (1, 1), (2, 1), (3, 1), (99, 1);
+"""
+
+
+async def _create_legacy_database():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        await raw_connection.driver_connection.execute("PRAGMA foreign_keys=OFF")
+        await raw_connection.driver_connection.executescript(LEGACY_SCHEMA)
+    await dispose_engines()
+
+
+@pytest.fixture
+def database():
+    asyncio.run(_create_legacy_database())
+
+
+async def _query(sql: str):
+    async with engine.connect() as conn:
+        return (await conn.exec_driver_sql(sql)).all()
+
+
+def test_legacy_tables_are_upgraded(client, caplog):
+    posts_sql = client.portal.call(
+        _query, "SELECT sql FROM sqlite_master WHERE name = 'posts'"
+    )[0][0]
+    indexes = {row[1] for row in client.portal.call(_query, "PRAGMA index_list(posts)")}
+
+    assert "ON DELETE CASCADE" in posts_sql
+    assert "AUTOINCREMENT" in posts_sql
+    assert "ix_posts_created_at" in indexes
+    assert client.get("/api/posts/1").json()["tags"] == ["Tips"]
+    # The post of a missing user was dropped, then the association rows that
+    # pointed at it or at another missing post.
+    assert client.portal.call(_query, "SELECT id FROM posts") == [(1,), (2,)]
+    assert client.portal.call(_query, "SELECT * FROM post_tag_association") == [
+        (1, 1),
+        (2, 1),
+    ]
+    # The upgrade runs while the client starts, in the setup phase.
+    startup_log = "\n".join(r.getMessage() for r in caplog.get_records("setup"))
+    assert "Deleted 1 rows from posts" in startup_log
+    assert "Deleted 2 rows from post_tag_association" in startup_log
+
+
+def test_user_delete_cascades_on_legacy_database(client):
+    assert client.delete("/api/users/1").status_code == 204
+
+    assert client.get("/api/posts").json() == []
+    assert client.portal.call(_query, "SELECT * FROM post_tag_association") == []
+
+
+def test_upgrade_is_a_no_op_on_current_schema(client):
+    before = client.portal.call(_query, "SELECT sql FROM sqlite_master")
+    client.portal.call(migrations.upgrade_schema, engine)
+
+    assert client.portal.call(_query, "SELECT sql FROM sqlite_master") == before
@@ -15,25 +15,44 @@ def format_date(date_str: str, fmt: str = "%B %d, %Y (%A)"):
     return dt.strftime(fmt)
 
 
+def insert_ignore_conflicts(db: AsyncSession, table, index_elements: list[str]):
+    """
+    Return an INSERT for the session's dialect that skips rows clashing with
+    the unique index_elements, so concurrent inserts of the same row are safe.
+    Returns None for dialects without ON CONFLICT support.
+    """
+    match db.get_bind().dialect.name:
+        case "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        case "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        case _:
+            return None
+    return insert(table).on_conflict_do_nothing(index_elements=index_elements)
+
+
 async def seed_tags(db: AsyncSession):
     """Populate the db with the predefined tags in enums.py"""
-    for tag in Tags:
-        tag_name = tag.value
-        result = await db.execute(select(models.Tag).where(models.Tag.name == tag_name))
-        if not result.scalars().first():
-            db.add(models.Tag(name=tag_name))
+    rows = [{"name": tag.value} for tag in Tags]
+    stmt = insert_ignore_conflicts(db, models.Tag, ["name"])
+    if stmt is not None:
+        await db.execute(stmt, rows)
+    else:
+        # Portable fallback: only insert the tags that are missing.
+        result = await db.execute(select(models.Tag.name))
+        existing = set(result.scalars())
+        db.add_all(models.Tag(**row) for row in rows if row["name"] not in existing)
     await db.commit()
 
 
 async def get_db_tags(db: AsyncSession, tag_enums: list[Tags]) -> list[models.Tag]:
     """Fetches models.Tag instances from the database based on a list of Tags enums."""
-    db_tags = []
-    for tag_enum in tag_enums:
-        tag_name = tag_enum.value
-        tag_result = await db.execute(
-            select(models.Tag).where(models.Tag.name == tag_name)
-        )
-        db_tag = tag_result.scalars().first()
-        if db_tag:
-            db_tags.append(db_tag)
-    return db_tags
+    tag_names = [tag_enum.value for tag_enum in tag_enums]
+    if not tag_names:
+        return []
+    tag_result = await db.execute(
+        select(models.Tag).where(models.Tag.name.in_(tag_names))
+    )
+    db_tags = {db_tag.name: db_tag for db_tag in tag_result.scalars()}
+    # Keep the order the tags were given in.
+    return [db_tags[name] for name in dict.fromkeys(tag_names) if name in db_tags]